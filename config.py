@@ -3,8 +3,10 @@ Configuration module with singleton pattern for ModeratorBot.
 Caches config object to prevent repeated environment variable loading.
 """
 
+import logging
 import os
-from typing import List, Optional
+from functools import cached_property, lru_cache
+from typing import FrozenSet, List, Optional
 from dotenv import load_dotenv
 
 
@@ -40,9 +42,8 @@ class Config:
                 self.ADMIN_IDS = [int(id_str.strip()) for id_str in admin_ids_str.split(',') if id_str.strip()]
             except ValueError:
                 self.ADMIN_IDS = []
-        
-        # Community rules
-        self.RULES: str = os.getenv('RULES', 'Соблюдаем правила сообщества.')
+        # Set for O(1) membership checks on every message
+        self.ADMIN_ID_SET: FrozenSet[int] = frozenset(self.ADMIN_IDS)
         
         # Anti-flood settings
         self.ANTIFLOOD_MAX_MESSAGES: int = int(os.getenv('ANTIFLOOD_MAX_MESSAGES', '5'))
@@ -52,23 +53,51 @@ class Config:
         self.WARNS_TO_PUNISH: int = int(os.getenv('WARNS_TO_PUNISH', '3'))
         self.AUTO_MUTE_HOURS: int = int(os.getenv('AUTO_MUTE_HOURS', '24'))
         
-        # Allowed domains for links
-        allowed_domains_str = os.getenv('ALLOWED_DOMAINS', '')
-        self.ALLOWED_DOMAINS: List[str] = []
-        if allowed_domains_str:
-            self.ALLOWED_DOMAINS = [domain.strip() for domain in allowed_domains_str.split(',') if domain.strip()]
+        # Database path
+        self.DB_PATH: str = os.getenv('DB_PATH', './data/modbot.db')
+        self.DB_CACHE_SIZE_KB: int = int(os.getenv('DB_CACHE_SIZE_KB', '16000'))
+        self.DB_MMAP_SIZE: int = int(os.getenv('DB_MMAP_SIZE', '268435456'))
         
-        # Banned words
-        banned_words_str = os.getenv('BANNED_WORDS', '')
-        self.BANNED_WORDS: List[str] = []
-        if banned_words_str:
-            self.BANNED_WORDS = [word.strip().lower() for word in banned_words_str.split(',') if word.strip()]
+        # HTTP connection pool for Bot API requests
+        self.HTTP_POOL_SIZE: int = int(os.getenv('HTTP_POOL_SIZE', '256'))
+        self.HTTP_VERSION: str = os.getenv('HTTP_VERSION', '2')
         
-        # Captcha settings
-        self.CAPTCHA_TIMEOUT_SECONDS: int = int(os.getenv('CAPTCHA_TIMEOUT_SECONDS', '120'))
+        # Notification batching settings
+        self.BATCH_ENABLED: bool = os.getenv('BATCH_ENABLED', 'true').strip().lower() in ('1', 'true', 'yes')
+        self.BATCH_FLUSH_INTERVAL: float = float(os.getenv('BATCH_FLUSH_INTERVAL', '0.5'))
+        self.MAX_BUFFER_SIZE: int = int(os.getenv('MAX_BUFFER_SIZE', '20'))
         
-        # Database path
-        self.DB_PATH: str = os.getenv('DB_PATH', './data/modbot.db')
+        # Seconds a chat's administrator list is reused before refetching
+        self.ADMIN_CACHE_TTL: int = int(os.getenv('ADMIN_CACHE_TTL', '60'))
+    
+    # Rarely used settings are parsed on first access
+    
+    @cached_property
+    def RULES(self) -> str:
+        """Community rules text."""
+        return os.getenv('RULES', 'Соблюдаем правила сообщества.')
+    
+    @cached_property
+    def ALLOWED_DOMAINS(self) -> List[str]:
+        """Allowed domains for links."""
+        allowed_domains_str = os.getenv('ALLOWED_DOMAINS', '')
+        return [domain.strip() for domain in allowed_domains_str.split(',') if domain.strip()]
+    
+    @cached_property
+    def ALLOWED_DOMAIN_SET(self) -> FrozenSet[str]:
+        """Allowed domains in lower case for O(1) membership checks."""
+        return frozenset(domain.lower() for domain in self.ALLOWED_DOMAINS)
+    
+    @cached_property
+    def BANNED_WORDS(self) -> List[str]:
+        """Banned words in lower case."""
+        banned_words_str = os.getenv('BANNED_WORDS', '')
+        return [word.strip().lower() for word in banned_words_str.split(',') if word.strip()]
+    
+    @cached_property
+    def CAPTCHA_TIMEOUT_SECONDS(self) -> int:
+        """Time given to new members to solve the captcha."""
+        return int(os.getenv('CAPTCHA_TIMEOUT_SECONDS', '120'))
     
     def _validate_config(self) -> None:
         """Validate critical configuration parameters."""
@@ -77,10 +106,10 @@ class Config:
         
         # Check that admin list is not empty (warning, not error)
         if not self.ADMIN_IDS:
-            import logging
             logging.warning("ADMIN_IDS is empty - no administrators configured")
 
 
+@lru_cache(maxsize=None)
 def get_config() -> Config:
-    """Get singleton configuration instance."""
+    """Get singleton configuration instance, constructed on the first call only."""
     return Config()
\ No newline at end of file
@@ -5,8 +5,13 @@ Handles user warnings, captcha tracking, and other persistent data.
 
 import asyncio
 import logging
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Optional
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
 import aiosqlite
 
@@ -15,6 +20,37 @@ from config import get_config
 logger = logging.getLogger(__name__)
 config = get_config()
 
+# Size of sqlite3's per-connection prepared statement cache
+STATEMENT_CACHE_SIZE = 256
+
+# Read-only connections serving SELECTs alongside the single writer
+READ_POOL_SIZE = 4
+
+# How long a connection waits for another connection's lock before SQLITE_BUSY
+BUSY_TIMEOUT_MS = 5000
+
+# Number of (user_id, chat_id) warning counts kept in memory
+WARNING_COUNT_CACHE_SIZE = 4096
+
+# Seconds between writes of buffered warnings
+WARNING_FLUSH_INTERVAL = 0.1
+# Buffered warnings that trigger a write before the interval ends
+WARNING_FLUSH_BATCH_SIZE = 32
+
+# Hot queries are kept as constants so the same SQL text always hits the statement cache
+_SQL_ADD_WARNING = 'INSERT INTO warnings (user_id, chat_id, reason, created_at) VALUES (?, ?, ?, ?)'
+_SQL_INCREMENT_WARNING_COUNT = (
+    'INSERT INTO warning_counts (user_id, chat_id, n, last_reason) VALUES (?, ?, 1, ?) '
+    'ON CONFLICT (user_id, chat_id) DO UPDATE SET n = n + 1, last_reason = excluded.last_reason'
+)
+_SQL_COUNT_WARNINGS = 'SELECT n FROM warning_counts WHERE user_id = ? AND chat_id = ?'
+_SQL_CLEAR_WARNINGS = 'DELETE FROM warnings WHERE user_id = ? AND chat_id = ?'
+_SQL_CLEAR_WARNING_COUNT = 'DELETE FROM warning_counts WHERE user_id = ? AND chat_id = ?'
+_SQL_ADD_CAPTCHA = 'INSERT OR REPLACE INTO captcha_pending (user_id, chat_id, join_time) VALUES (?, ?, ?)'
+_SQL_REMOVE_CAPTCHA = 'DELETE FROM captcha_pending WHERE user_id = ?'
+_SQL_PENDING_USERS = 'SELECT user_id, join_time FROM captcha_pending'
+_SQL_CLEANUP_CAPTCHA = 'DELETE FROM captcha_pending WHERE join_time < ?'
+
 
 class Database:
     """Database manager for ModeratorBot."""
@@ -23,46 +59,268 @@ class Database:
         """Initialize database manager."""
         self.db_path = config.DB_PATH
         self._initialized = False
+        self._conn: Optional[aiosqlite.Connection] = None
+        # Serializes explicit transactions; single statements autocommit without it
+        self._lock = asyncio.Lock()
+        # Mirror of captcha_pending as user ID -> join time, checked for every group message
+        self._pending: Dict[int, int] = {}
+        # Recently used warning counts, least recently used first
+        self._warning_counts: 'OrderedDict[Tuple[int, int], int]' = OrderedDict()
+        # Warnings not yet written, as (user_id, chat_id, reason, created_at)
+        self._warn_buffer: List[Tuple[int, int, str, int]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        # Set when the buffer reaches WARNING_FLUSH_BATCH_SIZE, or to wake the loop on close
+        self._flush_requested = asyncio.Event()
+        # Tells the flush loop to exit after its current write instead of being cancelled mid-transaction
+        self._stopping = False
+        self._read_pool: Optional['asyncio.Queue[aiosqlite.Connection]'] = None
     
     async def init_db(self) -> None:
-        """Initialize database and create tables."""
+        """Open the shared connection and create tables."""
         if self._initialized:
             return
         
-        # Create data directory if it doesn't exist
-        import os
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        
-        async with aiosqlite.connect(self.db_path) as db:
-            # Create warnings table
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS warnings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    chat_id INTEGER NOT NULL,
-                    reason TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Create captcha_pending table
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS captcha_pending (
-                    user_id INTEGER PRIMARY KEY,
-                    chat_id INTEGER NOT NULL,
-                    join_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        # Create data directory if it doesn't exist; a bare filename has none
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        
+        # Single connection reused for the whole process lifetime, in autocommit mode
+        self._conn = await aiosqlite.connect(
+            self.db_path,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            isolation_level=None
+        )
+        await self._configure_connection()
+        await self._enable_incremental_vacuum()
+        
+        # Create warnings table, kept as a log of individual warnings and reasons
+        await self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS warnings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                reason TEXT,
+                created_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now'))
+            )
+        ''')
+        
+        # Older databases stored created_at as 'YYYY-MM-DD HH:MM:SS' text
+        await self._conn.execute('''
+            UPDATE warnings
+            SET created_at = CAST(strftime('%s', created_at) AS INTEGER)
+            WHERE typeof(created_at) = 'text'
+        ''')
+        
+        # Warning lookups always filter by user and chat
+        await self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_warnings_user_chat ON warnings (user_id, chat_id)'
+        )
+        
+        # Counter per user and chat, so counting is a point lookup instead of COUNT(*)
+        cursor = await self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'warning_counts'"
+        )
+        has_warning_counts = await cursor.fetchone() is not None
+        await self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS warning_counts (
+                user_id INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                n INTEGER NOT NULL,
+                last_reason TEXT,
+                PRIMARY KEY (user_id, chat_id)
+            ) WITHOUT ROWID
+        ''')
+        if not has_warning_counts:
+            # Fill counters from existing warnings; the bare reason column comes from the MAX(id) row
+            await self._conn.execute('''
+                INSERT INTO warning_counts (user_id, chat_id, n, last_reason)
+                SELECT user_id, chat_id, n, reason FROM (
+                    SELECT user_id, chat_id, COUNT(*) AS n, reason, MAX(id)
+                    FROM warnings
+                    GROUP BY user_id, chat_id
                 )
             ''')
-            
-            await db.commit()
+        
+        # Create captcha_pending table
+        await self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS captcha_pending (
+                user_id INTEGER PRIMARY KEY,
+                chat_id INTEGER NOT NULL,
+                join_time INTEGER NOT NULL DEFAULT (strftime('%s', 'now'))
+            )
+        ''')
+        
+        # Older databases stored join_time as 'YYYY-MM-DD HH:MM:SS' text
+        await self._conn.execute('''
+            UPDATE captcha_pending
+            SET join_time = CAST(strftime('%s', join_time) AS INTEGER)
+            WHERE typeof(join_time) = 'text'
+        ''')
+        
+        # Cleanup is a range scan over join_time
+        await self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_captcha_join_time ON captcha_pending (join_time)'
+        )
+        
+        await self._load_pending()
+        await self._open_read_pool()
+        self._stopping = False
+        self._flush_task = asyncio.create_task(self._flush_loop())
         
         self._initialized = True
         logger.info("Database initialized successfully")
     
+    async def _configure_connection(self) -> None:
+        """Apply performance PRAGMAs to the shared connection."""
+        # WAL lets readers run alongside the writer, NORMAL sync drops the fsync per commit
+        await self._conn.execute('PRAGMA journal_mode=WAL')
+        await self._conn.execute('PRAGMA synchronous=NORMAL')
+        # Wait for locks held by other connections instead of failing with SQLITE_BUSY
+        await self._conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        await self._conn.execute('PRAGMA temp_store=MEMORY')
+        # PRAGMA values can't be bound as parameters; both settings are parsed as int
+        await self._conn.execute(f'PRAGMA cache_size=-{config.DB_CACHE_SIZE_KB}')
+        await self._conn.execute(f'PRAGMA mmap_size={config.DB_MMAP_SIZE}')
+    
+    async def _open_read_pool(self) -> None:
+        """Open read-only connections; in WAL mode they read while the writer commits."""
+        read_uri = f"{Path(self.db_path).absolute().as_uri()}?mode=ro"
+        self._read_pool = asyncio.Queue()
+        for _ in range(READ_POOL_SIZE):
+            conn = await aiosqlite.connect(read_uri, uri=True, cached_statements=STATEMENT_CACHE_SIZE)
+            await conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+            await conn.execute(f'PRAGMA cache_size=-{config.DB_CACHE_SIZE_KB}')
+            await conn.execute(f'PRAGMA mmap_size={config.DB_MMAP_SIZE}')
+            self._read_pool.put_nowait(conn)
+    
+    @asynccontextmanager
+    async def _read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read-only connection from the pool."""
+        conn = await self._read_pool.get()
+        try:
+            yield conn
+        finally:
+            self._read_pool.put_nowait(conn)
+    
+    @asynccontextmanager
+    async def _transaction(self) -> AsyncIterator[None]:
+        """
+        Run statements in one write transaction. Caller must hold the lock.
+        
+        Single statements issued by other coroutines meanwhile join this transaction.
+        """
+        await self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            await self._conn.execute('ROLLBACK')
+            raise
+        await self._conn.execute('COMMIT')
+    
+    async def _enable_incremental_vacuum(self) -> None:
+        """Switch database to incremental auto-vacuum so free pages can be reclaimed."""
+        cursor = await self._conn.execute('PRAGMA auto_vacuum')
+        row = await cursor.fetchone()
+        # 2 is INCREMENTAL
+        if row[0] == 2:
+            return
+        
+        # Changing the mode of an existing database only takes effect after VACUUM
+        await self._conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        await self._conn.execute('VACUUM')
+        logger.info("Enabled incremental auto-vacuum")
+    
+    async def _load_pending(self) -> None:
+        """Load pending captcha users and their join times from the database."""
+        cursor = await self._conn.execute(_SQL_PENDING_USERS)
+        rows = await cursor.fetchall()
+        self._pending = {user_id: join_time for user_id, join_time in rows}
+    
+    def _cache_warning_count(self, user_id: int, chat_id: int, count: int) -> int:
+        """
+        Remember warning count, evicting the least recently used entry when full.
+        
+        Args:
+            user_id: ID of user
+            chat_id: Chat ID
+            count: Current warning count
+            
+        Returns:
+            int: The cached count
+        """
+        key = (user_id, chat_id)
+        self._warning_counts[key] = count
+        self._warning_counts.move_to_end(key)
+        if len(self._warning_counts) > WARNING_COUNT_CACHE_SIZE:
+            self._warning_counts.popitem(last=False)
+        return count
+    
+    async def _flush_warnings(self) -> None:
+        """Write buffered warnings in one transaction. Caller must hold the lock."""
+        if not self._warn_buffer:
+            return
+        
+        batch = self._warn_buffer
+        self._warn_buffer = []
+        try:
+            async with self._transaction():
+                await self._conn.executemany(
+                    _SQL_INCREMENT_WARNING_COUNT,
+                    [(user_id, chat_id, reason) for user_id, chat_id, reason, _ in batch]
+                )
+                await self._conn.executemany(_SQL_ADD_WARNING, batch)
+        except asyncio.CancelledError:
+            # The transaction was rolled back, so keep the batch for the next write
+            self._warn_buffer[:0] = batch
+            raise
+        except Exception as e:
+            logger.exception(f"Failed to save {len(batch)} warnings: {e}")
+    
+    async def _flush_loop(self) -> None:
+        """Write buffered warnings every interval, or sooner when the buffer fills, until stopped."""
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), WARNING_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            if not self._warn_buffer:
+                continue
+            async with self._lock:
+                await self._flush_warnings()
+    
+    async def close(self) -> None:
+        """Write buffered warnings and close the shared connection."""
+        if self._conn is None:
+            return
+        
+        if self._flush_task is not None:
+            # Let a write in progress commit rather than cancelling it halfway
+            self._stopping = True
+            self._flush_requested.set()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        async with self._lock:
+            await self._flush_warnings()
+        
+        if self._read_pool is not None:
+            while not self._read_pool.empty():
+                await self._read_pool.get_nowait().close()
+            self._read_pool = None
+        
+        await self._conn.close()
+        self._conn = None
+        self._initialized = False
+        logger.info("Database connection closed")
+    
     async def add_warning(self, user_id: int, chat_id: int, reason: str = "Нарушение правил") -> int:
         """
         Add warning to user.
         
+        The warning is buffered and written by the background flush; the
+        returned count already includes it.
+        
         Args:
             user_id: ID of user to warn
             chat_id: Chat ID where warning was issued
@@ -71,20 +329,12 @@ class Database:
         Returns:
             int: Total warning count for user in this chat
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                'INSERT INTO warnings (user_id, chat_id, reason) VALUES (?, ?, ?)',
-                (user_id, chat_id, reason)
-            )
-            await db.commit()
-            
-            # Get total warning count
-            cursor = await db.execute(
-                'SELECT COUNT(*) FROM warnings WHERE user_id = ? AND chat_id = ?',
-                (user_id, chat_id)
-            )
-            result = await cursor.fetchone()
-            return result[0] if result else 0
+        count = await self.get_warning_count(user_id, chat_id)
+        # Timestamp is taken now, not when the batch is written
+        self._warn_buffer.append((user_id, chat_id, reason, int(time.time())))
+        if len(self._warn_buffer) >= WARNING_FLUSH_BATCH_SIZE:
+            self._flush_requested.set()
+        return self._cache_warning_count(user_id, chat_id, count + 1)
     
     async def get_warning_count(self, user_id: int, chat_id: int) -> int:
         """
@@ -97,13 +347,27 @@ class Database:
         Returns:
             int: Warning count
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                'SELECT COUNT(*) FROM warnings WHERE user_id = ? AND chat_id = ?',
+        key = (user_id, chat_id)
+        if key in self._warning_counts:
+            self._warning_counts.move_to_end(key)
+            return self._warning_counts[key]
+        
+        # Buffered warnings must be committed before counting
+        if self._warn_buffer:
+            async with self._lock:
+                await self._flush_warnings()
+        
+        async with self._read() as conn:
+            cursor = await conn.execute(
+                _SQL_COUNT_WARNINGS,
                 (user_id, chat_id)
             )
             result = await cursor.fetchone()
-            return result[0] if result else 0
+        
+        # A concurrent add_warning or clear_warnings may have cached a newer count meanwhile
+        if key in self._warning_counts:
+            return self._warning_counts[key]
+        return self._cache_warning_count(user_id, chat_id, result[0] if result else 0)
     
     async def clear_warnings(self, user_id: int, chat_id: int) -> None:
         """
@@ -113,12 +377,18 @@ class Database:
             user_id: ID of user
             chat_id: Chat ID
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                'DELETE FROM warnings WHERE user_id = ? AND chat_id = ?',
-                (user_id, chat_id)
-            )
-            await db.commit()
+        async with self._lock:
+            await self._flush_warnings()
+            async with self._transaction():
+                await self._conn.execute(
+                    _SQL_CLEAR_WARNING_COUNT,
+                    (user_id, chat_id)
+                )
+                await self._conn.execute(
+                    _SQL_CLEAR_WARNINGS,
+                    (user_id, chat_id)
+                )
+            self._cache_warning_count(user_id, chat_id, 0)
     
     async def add_captcha_pending(self, user_id: int, chat_id: int) -> None:
         """
@@ -128,12 +398,12 @@ class Database:
             user_id: ID of user
             chat_id: Chat ID
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                'INSERT OR REPLACE INTO captcha_pending (user_id, chat_id) VALUES (?, ?)',
-                (user_id, chat_id)
-            )
-            await db.commit()
+        join_time = int(time.time())
+        self._pending[user_id] = join_time
+        await self._conn.execute(
+            _SQL_ADD_CAPTCHA,
+            (user_id, chat_id, join_time)
+        )
     
     async def remove_captcha_pending(self, user_id: int) -> None:
         """
@@ -142,12 +412,11 @@ class Database:
         Args:
             user_id: ID of user
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                'DELETE FROM captcha_pending WHERE user_id = ?',
-                (user_id,)
-            )
-            await db.commit()
+        self._pending.pop(user_id, None)
+        await self._conn.execute(
+            _SQL_REMOVE_CAPTCHA,
+            (user_id,)
+        )
     
     async def is_captcha_pending(self, user_id: int) -> bool:
         """
@@ -159,24 +428,32 @@ class Database:
         Returns:
             bool: True if user has pending captcha
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute(
-                'SELECT 1 FROM captcha_pending WHERE user_id = ?',
-                (user_id,)
-            )
-            result = await cursor.fetchone()
-            return result is not None
+        # Served from memory; the mirror is kept in sync by every write
+        return user_id in self._pending
     
     async def cleanup_old_captcha(self) -> None:
         """Clean up old captcha entries that have timed out."""
-        timeout_seconds = config.CAPTCHA_TIMEOUT_SECONDS
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
-                '''DELETE FROM captcha_pending 
-                   WHERE datetime(join_time, '+{} seconds') < datetime('now')'''.format(timeout_seconds)
-            )
-            await db.commit()
+        cutoff = int(time.time()) - config.CAPTCHA_TIMEOUT_SECONDS
+        # The mirror holds the same join times, so it is pruned without reading them back
+        expired = [user_id for user_id, join_time in self._pending.items() if join_time < cutoff]
+        for user_id in expired:
+            del self._pending[user_id]
+        
+        await self._conn.execute(
+            _SQL_CLEANUP_CAPTCHA,
+            (cutoff,)
+        )
+    
+    async def optimize(self) -> None:
+        """Let SQLite refresh statistics for tables whose contents changed."""
+        await self._conn.execute('PRAGMA optimize')
+    
+    async def incremental_vacuum(self) -> None:
+        """Return free pages left by deleted rows to the filesystem."""
+        # The pragma frees pages as it is stepped, so it must be run to completion
+        cursor = await self._conn.execute('PRAGMA incremental_vacuum')
+        await cursor.fetchall()
 
 
 # Global database instance
-db = Database()
\ No newline at end of file
+db = Database()
@@ -4,9 +4,12 @@ Telegram bot for chat moderation with anti-flood, link filtering, and captcha.
 """
 
 import asyncio
+import html
 import logging
 import random
-from typing import List, Optional
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
 from telegram import (
     CallbackQuery, Chat, InlineKeyboardButton, InlineKeyboardMarkup, 
@@ -17,12 +20,29 @@ from telegram.ext import (
     Application, CallbackQueryHandler, ChatMemberHandler, CommandHandler, 
     ContextTypes, MessageHandler, filters
 )
+from telegram.error import TelegramError
+from telegram.request import HTTPXRequest
+
+try:
+    import uvloop
+except ImportError:  # uvloop is optional and unavailable on Windows
+    uvloop = None
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the standard json module is used without it
+    orjson = None
 
 from config import get_config
 from database import db
+from notifier import (
+    enqueue_delete, flush_notifications, queue_notification, start_outbound_workers,
+    stop_outbound_workers
+)
 from utils import (
-    check_flood, contains_banned_words, contains_links, format_user_mention,
-    has_disallowed_links, is_admin, is_command_message, kick_user, mute_user
+    UNMUTED_PERMISSIONS, NonAdminFilter, check_flood, classify_message, cleanup_flood_tracking,
+    format_duration, format_user_mention, invalidate_admin_cache, is_admin, is_admin_status_change,
+    is_command_message, kick_user, mute_user, require_admin, require_reply
 )
 
 # Set up logging
@@ -35,6 +55,124 @@ logger = logging.getLogger(__name__)
 # Get configuration
 config = get_config()
 
+# Mute durations in hours: for flooding and default for /mute
+FLOOD_MUTE_HOURS = 1
+DEFAULT_MUTE_HOURS = 24
+
+# Settings used by handlers on every call, bound once at import
+WARNS_TO_PUNISH = config.WARNS_TO_PUNISH
+AUTO_MUTE_HOURS = config.AUTO_MUTE_HOURS
+# New members stay muted for the captcha timeout rounded up to whole hours
+CAPTCHA_MUTE_HOURS = config.CAPTCHA_TIMEOUT_SECONDS // 3600 + 1
+ALLOWED_DOMAINS_TEXT = ", ".join(config.ALLOWED_DOMAINS)
+WARN_LIMIT_REASON = f"Достигнут лимит предупреждений ({WARNS_TO_PUNISH})"
+
+# Durations used in automatic notices never change, format them once
+FLOOD_MUTE_DURATION_TEXT = format_duration(FLOOD_MUTE_HOURS)
+AUTO_MUTE_DURATION_TEXT = format_duration(AUTO_MUTE_HOURS)
+
+# Handler filters, built once at import
+GROUP_FILTER = filters.ChatType.GROUPS
+NEW_MEMBERS_FILTER = filters.StatusUpdate.NEW_CHAT_MEMBERS & GROUP_FILTER
+# Messages from known admins are dropped in the dispatcher, before handle_message runs
+MODERATION_FILTER = filters.TEXT & ~filters.COMMAND & GROUP_FILTER & NonAdminFilter()
+
+# Static response texts, built once
+START_USER_TEXT = "Этот бот предназначен для модерации групп."
+START_ADMIN_TEXT = (
+    "🤖 <b>ModeratorBot</b>\n\n"
+    "Доступные команды для администраторов:\n"
+    "/rules - показать правила\n"
+    "/warn - выдать предупреждение\n"
+    "/unwarn - снять предупреждения\n"
+    "/mute - заглушить пользователя\n"
+    "/kick - исключить пользователя\n"
+    "/warnings - показать предупреждения пользователя"
+)
+INVALID_DURATION_TEXT = "❌ Неверная длительность. Укажите целое число часов, например: /mute 2 спам"
+WARNING_TEMPLATE = (
+    "⚠️ Предупреждение для {user}\n"
+    "Причина: {reason}\n"
+    "Предупреждений: {count}/{limit}"
+)
+CAPTCHA_WELCOME_TEMPLATE = (
+    "👋 Добро пожаловать, {user}!\n\n"
+    "Для подтверждения того, что вы не бот, решите простой пример:\n"
+    f"У вас есть {config.CAPTCHA_TIMEOUT_SECONDS} секунд."
+)
+
+# Automatic moderation notices with the fixed parts already filled in
+FLOOD_MUTE_TEMPLATE = "🔇 {user} заглушен на " + FLOOD_MUTE_DURATION_TEXT + " за флуд."
+BANNED_WORDS_TEMPLATE = (
+    "❌ {user}, сообщение удалено за использование запрещенных слов.\n"
+    "Предупреждений: {count}/" + str(WARNS_TO_PUNISH)
+)
+DISALLOWED_LINK_TEMPLATE = (
+    "🔗 {user}, ссылка удалена. Разрешены только ссылки на: "
+    + ALLOWED_DOMAINS_TEXT.replace("{", "{{").replace("}", "}}") + "\n"
+    "Предупреждений: {count}/" + str(WARNS_TO_PUNISH)
+)
+
+# Captcha operands are 1..10; question and answer button labels are precomputed
+CAPTCHA_MIN_OPERAND = 1
+CAPTCHA_MAX_OPERAND = 10
+CAPTCHA_QUESTIONS = {
+    (num1, num2): f"{num1} + {num2} = ?"
+    for num1 in range(CAPTCHA_MIN_OPERAND, CAPTCHA_MAX_OPERAND + 1)
+    for num2 in range(CAPTCHA_MIN_OPERAND, CAPTCHA_MAX_OPERAND + 1)
+}
+CAPTCHA_LABELS = [str(value) for value in range(2 * CAPTCHA_MAX_OPERAND + 2)]
+
+# Captcha button callback data: captcha_<question|correct|wrong>_<user_id>
+CAPTCHA_CALLBACK_RE = re.compile(r"^captcha_(question|correct|wrong)_(\d+)$")
+
+
+
+class OrjsonRequest(HTTPXRequest):
+    """HTTPXRequest decoding Bot API responses with orjson."""
+    
+    @staticmethod
+    def parse_json_payload(payload: bytes) -> Dict[str, Any]:
+        """
+        Parse Bot API response body.
+        
+        Args:
+            payload: Raw response body
+            
+        Returns:
+            Dict[str, Any]: Decoded JSON object
+        """
+        try:
+            return orjson.loads(payload)
+        except ValueError as exc:
+            raise TelegramError("Invalid server response") from exc
+
+
+def build_requests() -> Tuple[HTTPXRequest, HTTPXRequest]:
+    """
+    Create request objects for Bot API calls and for polling updates.
+    
+    Returns:
+        Tuple[HTTPXRequest, HTTPXRequest]: Request for API calls, request for getUpdates
+    """
+    request_class = OrjsonRequest if orjson is not None else HTTPXRequest
+    request = request_class(
+        connection_pool_size=config.HTTP_POOL_SIZE,
+        pool_timeout=5.0,
+        connect_timeout=5.0,
+        read_timeout=10.0,
+        http_version=config.HTTP_VERSION
+    )
+    # Polling keeps a single long-lived getUpdates request in flight
+    get_updates_request = request_class(connection_pool_size=1, http_version=config.HTTP_VERSION)
+    return request, get_updates_request
+
+
+@lru_cache(maxsize=1)
+def get_rules_text() -> str:
+    """Build /rules response once, rules don't change after load."""
+    return f"📋 <b>Правила сообщества</b>\n\n{html.escape(config.RULES)}"
+
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /start command."""
@@ -43,27 +181,16 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             return
         
         user = update.effective_user
-        if user.id not in config.ADMIN_IDS:
+        if user.id not in config.ADMIN_ID_SET:
             await update.message.reply_text(
-                "Этот бот предназначен для модерации групп.",
+                START_USER_TEXT,
                 disable_notification=True
             )
             return
         
-        welcome_text = (
-            "🤖 *ModeratorBot*\n\n"
-            "Доступные команды для администраторов:\n"
-            "/rules - показать правила\n"
-            "/warn - выдать предупреждение\n"
-            "/unwarn - снять предупреждения\n"
-            "/mute - заглушить пользователя\n"
-            "/kick - исключить пользователя\n"
-            "/warnings - показать предупреждения пользователя"
-        )
-        
         await update.message.reply_text(
-            welcome_text,
-            parse_mode=ParseMode.MARKDOWN,
+            START_ADMIN_TEXT,
+            parse_mode=ParseMode.HTML,
             disable_notification=True
         )
     except Exception as e:
@@ -73,30 +200,20 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 async def rules_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /rules command."""
     try:
-        rules_text = f"📋 *Правила сообщества*\n\n{config.RULES}"
         await update.message.reply_text(
-            rules_text,
-            parse_mode=ParseMode.MARKDOWN,
+            get_rules_text(),
+            parse_mode=ParseMode.HTML,
             disable_notification=True
         )
     except Exception as e:
         logger.exception(f"Error in rules command: {e}")
 
 
+@require_admin
+@require_reply("Ответьте на сообщение пользователя, которого хотите предупредить.")
 async def warn_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /warn command."""
     try:
-        if not await is_admin(update.effective_user, update.effective_chat, context):
-            return
-        
-        # Check if command is a reply to another message
-        if not update.message.reply_to_message:
-            await update.message.reply_text(
-                "Ответьте на сообщение пользователя, которого хотите предупредить.",
-                disable_notification=True
-            )
-            return
-        
         target_user = update.message.reply_to_message.from_user
         reason = " ".join(context.args) if context.args else "Нарушение правил"
         
@@ -107,47 +224,44 @@ async def warn_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
             reason
         )
         
-        warning_text = (
-            f"⚠️ Предупреждение для {format_user_mention(target_user)}\n"
-            f"Причина: {reason}\n"
-            f"Предупреждений: {warning_count}/{config.WARNS_TO_PUNISH}"
+        warning_text = WARNING_TEMPLATE.format(
+            user=format_user_mention(target_user),
+            reason=reason,
+            count=warning_count,
+            limit=WARNS_TO_PUNISH
         )
         
-        await update.message.reply_text(warning_text, disable_notification=True)
+        if warning_count < WARNS_TO_PUNISH:
+            await update.message.reply_text(warning_text, disable_notification=True)
+            return
         
-        # Auto-mute if reached warning limit
-        if warning_count >= config.WARNS_TO_PUNISH:
-            success = await mute_user(
+        # Limit reached: send the warning and auto-mute concurrently
+        _, success = await asyncio.gather(
+            update.message.reply_text(warning_text, disable_notification=True),
+            mute_user(
                 target_user.id,
                 update.effective_chat.id,
-                config.AUTO_MUTE_HOURS,
+                AUTO_MUTE_HOURS,
                 context,
-                f"Достигнут лимит предупреждений ({config.WARNS_TO_PUNISH})"
+                WARN_LIMIT_REASON
+            )
+        )
+        
+        if success:
+            await update.message.reply_text(
+                f"🔇 {format_user_mention(target_user)} заглушен на {AUTO_MUTE_DURATION_TEXT} "
+                f"за достижение лимита предупреждений.",
+                disable_notification=True
             )
-            
-            if success:
-                await update.message.reply_text(
-                    f"🔇 {format_user_mention(target_user)} заглушен на {config.AUTO_MUTE_HOURS} часов "
-                    f"за достижение лимита предупреждений.",
-                    disable_notification=True
-                )
     except Exception as e:
         logger.exception(f"Error in warn command: {e}")
 
 
+@require_admin
+@require_reply("Ответьте на сообщение пользователя, у которого хотите снять предупреждения.")
 async def unwarn_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /unwarn command."""
     try:
-        if not await is_admin(update.effective_user, update.effective_chat, context):
-            return
-        
-        if not update.message.reply_to_message:
-            await update.message.reply_text(
-                "Ответьте на сообщение пользователя, у которого хотите снять предупреждения.",
-                disable_notification=True
-            )
-            return
-        
         target_user = update.message.reply_to_message.from_user
         await db.clear_warnings(target_user.id, update.effective_chat.id)
         
@@ -159,28 +273,30 @@ async def unwarn_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         logger.exception(f"Error in unwarn command: {e}")
 
 
+@require_admin
+@require_reply("Ответьте на сообщение пользователя, которого хотите заглушить.")
 async def mute_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /mute command."""
     try:
-        if not await is_admin(update.effective_user, update.effective_chat, context):
-            return
-        
-        if not update.message.reply_to_message:
+        target_user = update.message.reply_to_message.from_user
+        duration_arg = context.args[0] if context.args else None
+        if duration_arg is None:
+            duration = DEFAULT_MUTE_HOURS
+        elif duration_arg.isdecimal() and int(duration_arg) > 0:
+            duration = int(duration_arg)
+        else:
             await update.message.reply_text(
-                "Ответьте на сообщение пользователя, которого хотите заглушить.",
+                INVALID_DURATION_TEXT,
                 disable_notification=True
             )
             return
-        
-        target_user = update.message.reply_to_message.from_user
-        duration = int(context.args[0]) if context.args and context.args[0].isdigit() else 24
         reason = " ".join(context.args[1:]) if len(context.args) > 1 else "Нарушение правил"
         
         success = await mute_user(target_user.id, update.effective_chat.id, duration, context, reason)
         
         if success:
             await update.message.reply_text(
-                f"🔇 {format_user_mention(target_user)} заглушен на {duration} часов.\n"
+                f"🔇 {format_user_mention(target_user)} заглушен на {format_duration(duration)}.\n"
                 f"Причина: {reason}",
                 disable_notification=True
             )
@@ -193,19 +309,11 @@ async def mute_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         logger.exception(f"Error in mute command: {e}")
 
 
+@require_admin
+@require_reply("Ответьте на сообщение пользователя, которого хотите исключить.")
 async def kick_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /kick command."""
     try:
-        if not await is_admin(update.effective_user, update.effective_chat, context):
-            return
-        
-        if not update.message.reply_to_message:
-            await update.message.reply_text(
-                "Ответьте на сообщение пользователя, которого хотите исключить.",
-                disable_notification=True
-            )
-            return
-        
         target_user = update.message.reply_to_message.from_user
         reason = " ".join(context.args) if context.args else "Нарушение правил"
         
@@ -226,78 +334,96 @@ async def kick_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         logger.exception(f"Error in kick command: {e}")
 
 
+@require_admin
+@require_reply("Ответьте на сообщение пользователя, чтобы посмотреть его предупреждения.")
 async def warnings_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /warnings command."""
     try:
-        if not await is_admin(update.effective_user, update.effective_chat, context):
-            return
-        
-        if not update.message.reply_to_message:
-            await update.message.reply_text(
-                "Ответьте на сообщение пользователя, чтобы посмотреть его предупреждения.",
-                disable_notification=True
-            )
-            return
-        
         target_user = update.message.reply_to_message.from_user
         warning_count = await db.get_warning_count(target_user.id, update.effective_chat.id)
         
         await update.message.reply_text(
-            f"📊 {format_user_mention(target_user)} имеет {warning_count}/{config.WARNS_TO_PUNISH} предупреждений",
+            f"📊 {format_user_mention(target_user)} имеет {warning_count}/{WARNS_TO_PUNISH} предупреждений",
             disable_notification=True
         )
     except Exception as e:
         logger.exception(f"Error in warnings command: {e}")
 
 
+def build_captcha_keyboard(num1: int, num2: int, user_id: int) -> InlineKeyboardMarkup:
+    """
+    Build captcha keyboard for user from precomputed labels.
+    
+    Args:
+        num1: First operand
+        num2: Second operand
+        user_id: ID of user solving the captcha
+        
+    Returns:
+        InlineKeyboardMarkup: Question row and three answer buttons
+    """
+    answer = num1 + num2
+    wrong_data = f"captcha_wrong_{user_id}"
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(CAPTCHA_QUESTIONS[num1, num2], callback_data=f"captcha_question_{user_id}")],
+        [
+            InlineKeyboardButton(CAPTCHA_LABELS[answer - 1], callback_data=wrong_data),
+            InlineKeyboardButton(CAPTCHA_LABELS[answer], callback_data=f"captcha_correct_{user_id}"),
+            InlineKeyboardButton(CAPTCHA_LABELS[answer + 1], callback_data=wrong_data)
+        ]
+    ])
+
+
+async def start_captcha(chat_id: int, new_member: User, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Mute new member and send them a captcha.
+    
+    Args:
+        chat_id: Chat ID
+        new_member: Member who joined
+        context: Bot context
+    """
+    # Add to captcha pending
+    await db.add_captcha_pending(new_member.id, chat_id)
+    
+    # Generate simple math captcha
+    num1 = random.randint(CAPTCHA_MIN_OPERAND, CAPTCHA_MAX_OPERAND)
+    num2 = random.randint(CAPTCHA_MIN_OPERAND, CAPTCHA_MAX_OPERAND)
+    keyboard = build_captcha_keyboard(num1, num2, new_member.id)
+    welcome_text = CAPTCHA_WELCOME_TEMPLATE.format(user=format_user_mention(new_member))
+    
+    # Mute user until captcha is solved, sending the captcha at the same time
+    await asyncio.gather(
+        mute_user(
+            new_member.id,
+            chat_id,
+            CAPTCHA_MUTE_HOURS,
+            context,
+            "Проверка капчи"
+        ),
+        context.bot.send_message(
+            chat_id=chat_id,
+            text=welcome_text,
+            reply_markup=keyboard,
+            disable_notification=True
+        )
+    )
+
+
 async def handle_new_member(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle new chat members with captcha."""
     try:
-        for new_member in update.message.new_chat_members:
-            if new_member.is_bot:
-                continue
-            
-            # Add to captcha pending
-            await db.add_captcha_pending(new_member.id, update.effective_chat.id)
-            
-            # Generate simple math captcha
-            num1 = random.randint(1, 10)
-            num2 = random.randint(1, 10)
-            answer = num1 + num2
-            
-            # Store answer in context for verification
-            context.bot_data[f"captcha_{new_member.id}"] = answer
-            
-            keyboard = InlineKeyboardMarkup([
-                [InlineKeyboardButton(f"{num1} + {num2} = ?", callback_data=f"captcha_question_{new_member.id}")],
-                [
-                    InlineKeyboardButton(str(answer - 1), callback_data=f"captcha_wrong_{new_member.id}"),
-                    InlineKeyboardButton(str(answer), callback_data=f"captcha_correct_{new_member.id}"),
-                    InlineKeyboardButton(str(answer + 1), callback_data=f"captcha_wrong_{new_member.id}")
-                ]
-            ])
-            
-            # Mute user until captcha is solved
-            await mute_user(
-                new_member.id,
-                update.effective_chat.id,
-                config.CAPTCHA_TIMEOUT_SECONDS // 3600 + 1,  # Convert to hours
-                context,
-                "Проверка капчи"
-            )
-            
-            welcome_text = (
-                f"👋 Добро пожаловать, {format_user_mention(new_member)}!\n\n"
-                f"Для подтверждения того, что вы не бот, решите простой пример:\n"
-                f"У вас есть {config.CAPTCHA_TIMEOUT_SECONDS} секунд."
-            )
-            
-            await context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text=welcome_text,
-                reply_markup=keyboard,
-                disable_notification=True
-            )
+        chat_id = update.effective_chat.id
+        new_members = [member for member in update.message.new_chat_members if not member.is_bot]
+        
+        # Members added together are handled concurrently; one failure doesn't stop the others
+        results = await asyncio.gather(
+            *(start_captcha(chat_id, member, context) for member in new_members),
+            return_exceptions=True
+        )
+        for member, result in zip(new_members, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to start captcha for user {member.id} in chat {chat_id}: {result}")
     except Exception as e:
         logger.exception(f"Error handling new member: {e}")
 
@@ -306,48 +432,36 @@ async def handle_captcha_callback(update: Update, context: ContextTypes.DEFAULT_
     """Handle captcha button callbacks."""
     try:
         query = update.callback_query
-        await query.answer()
+        match = CAPTCHA_CALLBACK_RE.match(query.data)
+        # A query can be answered only once, so each branch answers it exactly once
+        if match is None or match.group(1) == "question":
+            await query.answer()
+            return
         
-        if query.data.startswith("captcha_correct_"):
-            user_id = int(query.data.split("_")[2])
-            
-            if query.from_user.id != user_id:
-                await query.answer("Это не ваша капча!", show_alert=True)
-                return
-            
-            # Remove from captcha pending
-            await db.remove_captcha_pending(user_id)
-            
-            # Unmute user
-            await context.bot.restrict_chat_member(
-                chat_id=query.message.chat_id,
-                user_id=user_id,
-                permissions={
-                    'can_send_messages': True,
-                    'can_send_media_messages': True,
-                    'can_send_polls': True,
-                    'can_send_other_messages': True,
-                    'can_add_web_page_previews': True,
-                    'can_change_info': False,
-                    'can_invite_users': False,
-                    'can_pin_messages': False
-                }
-            )
-            
-            await query.edit_message_text(
-                f"✅ {format_user_mention(query.from_user)} успешно прошел проверку!",
-                disable_notification=True
-            )
-            
-        elif query.data.startswith("captcha_wrong_"):
-            user_id = int(query.data.split("_")[2])
-            
-            if query.from_user.id != user_id:
-                await query.answer("Это не ваша капча!", show_alert=True)
-                return
-            
+        kind, user_id = match.group(1), int(match.group(2))
+        if query.from_user.id != user_id:
+            await query.answer("Это не ваша капча!", show_alert=True)
+            return
+        
+        if kind == "wrong":
             await query.answer("Неправильный ответ! Попробуйте еще раз.", show_alert=True)
-            
+            return
+        
+        await query.answer()
+        
+        # Remove from captcha pending
+        await db.remove_captcha_pending(user_id)
+        
+        # Unmute user
+        await context.bot.restrict_chat_member(
+            chat_id=query.message.chat_id,
+            user_id=user_id,
+            permissions=UNMUTED_PERMISSIONS
+        )
+        
+        await query.edit_message_text(
+            f"✅ {format_user_mention(query.from_user)} успешно прошел проверку!"
+        )
     except Exception as e:
         logger.exception(f"Error handling captcha callback: {e}")
 
@@ -369,7 +483,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         
         # Check if user has pending captcha
         if await db.is_captcha_pending(user.id):
-            await message.delete()
+            enqueue_delete(chat.id, message.message_id)
             return
         
         # Anti-flood check
@@ -377,24 +491,25 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             success = await mute_user(
                 user.id,
                 chat.id,
-                1,  # 1 hour mute for flooding
+                FLOOD_MUTE_HOURS,
                 context,
                 "Флуд сообщениями"
             )
             
             if success:
-                await context.bot.send_message(
-                    chat_id=chat.id,
-                    text=f"🔇 {format_user_mention(user)} заглушен на 1 час за флуд.",
-                    disable_notification=True
+                queue_notification(
+                    chat.id,
+                    FLOOD_MUTE_TEMPLATE.format(user=format_user_mention(user))
                 )
             
-            await message.delete()
+            enqueue_delete(chat.id, message.message_id)
             return
         
+        flags = classify_message(message.text)
+        
         # Check for banned words
-        if contains_banned_words(message.text):
-            await message.delete()
+        if flags.banned_words:
+            enqueue_delete(chat.id, message.message_id)
             
             warning_count = await db.add_warning(
                 user.id,
@@ -402,28 +517,26 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 "Использование запрещенных слов"
             )
             
-            await context.bot.send_message(
-                chat_id=chat.id,
-                text=f"❌ {format_user_mention(user)}, сообщение удалено за использование запрещенных слов.\n"
-                     f"Предупреждений: {warning_count}/{config.WARNS_TO_PUNISH}",
-                disable_notification=True
+            queue_notification(
+                chat.id,
+                BANNED_WORDS_TEMPLATE.format(user=format_user_mention(user), count=warning_count)
             )
             
             # Auto-mute if reached warning limit
-            if warning_count >= config.WARNS_TO_PUNISH:
+            if warning_count >= WARNS_TO_PUNISH:
                 await mute_user(
                     user.id,
                     chat.id,
-                    config.AUTO_MUTE_HOURS,
+                    AUTO_MUTE_HOURS,
                     context,
-                    f"Достигнут лимит предупреждений ({config.WARNS_TO_PUNISH})"
+                    WARN_LIMIT_REASON
                 )
             
             return
         
         # Check for disallowed links
-        if contains_links(message.text) and has_disallowed_links(message.text):
-            await message.delete()
+        if flags.disallowed_links:
+            enqueue_delete(chat.id, message.message_id)
             
             warning_count = await db.add_warning(
                 user.id,
@@ -431,21 +544,19 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 "Размещение запрещенных ссылок"
             )
             
-            await context.bot.send_message(
-                chat_id=chat.id,
-                text=f"🔗 {format_user_mention(user)}, ссылка удалена. Разрешены только ссылки на: {', '.join(config.ALLOWED_DOMAINS)}\n"
-                     f"Предупреждений: {warning_count}/{config.WARNS_TO_PUNISH}",
-                disable_notification=True
+            queue_notification(
+                chat.id,
+                DISALLOWED_LINK_TEMPLATE.format(user=format_user_mention(user), count=warning_count)
             )
             
             # Auto-mute if reached warning limit
-            if warning_count >= config.WARNS_TO_PUNISH:
+            if warning_count >= WARNS_TO_PUNISH:
                 await mute_user(
                     user.id,
                     chat.id,
-                    config.AUTO_MUTE_HOURS,
+                    AUTO_MUTE_HOURS,
                     context,
-                    f"Достигнут лимит предупреждений ({config.WARNS_TO_PUNISH})"
+                    WARN_LIMIT_REASON
                 )
             
             return
@@ -454,23 +565,74 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         logger.exception(f"Error handling message: {e}")
 
 
+async def handle_chat_member_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Forget cached chat administrators when someone is promoted or demoted."""
+    try:
+        member_update = update.chat_member or update.my_chat_member
+        if is_admin_status_change(member_update.old_chat_member.status, member_update.new_chat_member.status):
+            invalidate_admin_cache(member_update.chat.id)
+    except Exception as e:
+        logger.exception(f"Error handling chat member update: {e}")
+
+
+async def post_init(application: Application) -> None:
+    """Open database and start background workers once the event loop is running."""
+    await db.init_db()
+    await start_outbound_workers(application.bot)
+
+
+async def post_shutdown(application: Application) -> None:
+    """Stop background workers and close database on shutdown."""
+    await stop_outbound_workers()
+    await db.close()
+
+
 async def cleanup_task(context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Periodic cleanup task."""
+    """Periodic cleanup of expired captcha entries."""
     try:
         await db.cleanup_old_captcha()
+        await db.optimize()
         logger.info("Cleanup task completed")
     except Exception as e:
         logger.exception(f"Error in cleanup task: {e}")
 
 
+async def vacuum_task(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Daily reclaim of free database pages."""
+    try:
+        await db.incremental_vacuum()
+        logger.info("Database vacuum completed")
+    except Exception as e:
+        logger.exception(f"Error in vacuum task: {e}")
+
+
+async def flood_cleanup_task(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Periodic cleanup of idle users in anti-flood tracking."""
+    try:
+        removed = await cleanup_flood_tracking()
+        logger.info(f"Flood tracking cleanup removed {removed} idle users")
+    except Exception as e:
+        logger.exception(f"Error in flood cleanup task: {e}")
+
+
 def main() -> None:
     """Run the bot."""
     try:
-        # Create application
-        application = Application.builder().token(config.BOT_TOKEN).build()
+        # Use the faster libuv-based event loop when available
+        if uvloop is not None:
+            uvloop.install()
         
-        # Initialize database
-        asyncio.run(db.init_db())
+        # Create application
+        request, get_updates_request = build_requests()
+        application = (
+            Application.builder()
+            .token(config.BOT_TOKEN)
+            .request(request)
+            .get_updates_request(get_updates_request)
+            .post_init(post_init)
+            .post_shutdown(post_shutdown)
+            .build()
+        )
         
         # Add handlers
         application.add_handler(CommandHandler("start", start_command))
@@ -482,17 +644,30 @@ def main() -> None:
         application.add_handler(CommandHandler("warnings", warnings_command))
         
         # New member handler
-        application.add_handler(MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, handle_new_member))
+        application.add_handler(MessageHandler(NEW_MEMBERS_FILTER, handle_new_member))
         
         # Captcha callback handler
-        application.add_handler(CallbackQueryHandler(handle_captcha_callback, pattern="^captcha_"))
+        application.add_handler(CallbackQueryHandler(handle_captcha_callback, pattern=CAPTCHA_CALLBACK_RE))
         
         # Message handler for moderation
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+        application.add_handler(MessageHandler(MODERATION_FILTER, handle_message))
         
-        # Add cleanup job (every 10 minutes)
+        # Keep cached administrator lists in sync with promotions and demotions
+        application.add_handler(ChatMemberHandler(handle_chat_member_update, ChatMemberHandler.ANY_CHAT_MEMBER))
+        
+        # Add cleanup jobs, each subsystem on its own schedule
         job_queue = application.job_queue
         job_queue.run_repeating(cleanup_task, interval=600, first=10)
+        job_queue.run_repeating(flood_cleanup_task, interval=600, first=600)
+        job_queue.run_repeating(vacuum_task, interval=86400, first=3600)
+        
+        # Flush batched moderation notifications
+        if config.BATCH_ENABLED:
+            job_queue.run_repeating(
+                flush_notifications,
+                interval=config.BATCH_FLUSH_INTERVAL,
+                first=config.BATCH_FLUSH_INTERVAL
+            )
         
         # Start the bot
         logger.info("Starting ModeratorBot...")
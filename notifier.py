@@ -0,0 +1,205 @@
+"""
+Notification module for ModeratorBot.
+Batches per-chat moderation notices and performs outbound Telegram calls
+from background workers so handlers don't wait on the network.
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple, Union
+
+from telegram import Bot
+from telegram.constants import MessageLimit
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes
+
+from config import get_config
+
+logger = logging.getLogger(__name__)
+config = get_config()
+
+# Outbound queue settings
+OUTBOUND_QUEUE_SIZE = 1024
+OUTBOUND_WORKERS = 4
+
+# Pending notifications per chat, flushed by flush_notifications()
+_notify_buffers: Dict[int, List[str]] = {}
+
+# Outbound actions: (action, chat_id, payload) where payload is message ID, user ID or text
+_outbound_queue: Optional['asyncio.Queue[Tuple[str, int, Union[int, str]]]'] = None
+_outbound_tasks: List[asyncio.Task] = []
+
+
+def split_notifications(lines: List[str], limit: int = MessageLimit.MAX_TEXT_LENGTH) -> List[str]:
+    """
+    Join notification lines into as few messages as possible.
+    
+    Args:
+        lines: Notification texts in the order they were queued
+        limit: Maximum length of a single Telegram message
+        
+    Returns:
+        List[str]: Message texts, each no longer than limit
+    """
+    messages: List[str] = []
+    current: List[str] = []
+    current_length = 0
+    
+    for line in lines:
+        # Line longer than the limit on its own is sent truncated
+        line = line[:limit]
+        extra = len(line) + (1 if current else 0)
+        if current and current_length + extra > limit:
+            messages.append("\n".join(current))
+            current = []
+            current_length = 0
+            extra = len(line)
+        current.append(line)
+        current_length += extra
+    
+    if current:
+        messages.append("\n".join(current))
+    return messages
+
+
+def _enqueue(action: str, chat_id: int, payload: Union[int, str]) -> bool:
+    """
+    Put outbound action into the queue without waiting.
+    
+    Args:
+        action: One of "delete", "unban" or "send"
+        chat_id: Chat ID
+        payload: Message ID for "delete", user ID for "unban", text for "send"
+        
+    Returns:
+        bool: True if action was queued, False if it was dropped
+    """
+    if _outbound_queue is None:
+        logger.error(f"Outbound workers are not running, dropping {action} for chat {chat_id}")
+        return False
+    
+    try:
+        _outbound_queue.put_nowait((action, chat_id, payload))
+        return True
+    except asyncio.QueueFull:
+        logger.warning(f"Outbound queue is full, dropping {action} for chat {chat_id}")
+        return False
+
+
+def enqueue_delete(chat_id: int, message_id: int) -> None:
+    """
+    Schedule message deletion.
+    
+    Args:
+        chat_id: Chat ID
+        message_id: ID of message to delete
+    """
+    _enqueue("delete", chat_id, message_id)
+
+
+def enqueue_unban(chat_id: int, user_id: int) -> bool:
+    """
+    Schedule lifting of a ban so a kicked user can rejoin.
+    
+    Args:
+        chat_id: Chat ID
+        user_id: ID of banned user
+        
+    Returns:
+        bool: True if unban was queued, False if caller has to unban itself
+    """
+    return _enqueue("unban", chat_id, user_id)
+
+
+def _flush_chat(chat_id: int) -> None:
+    """
+    Schedule sending of all pending notifications of a chat.
+    
+    Args:
+        chat_id: Chat ID
+    """
+    lines = _notify_buffers.pop(chat_id, None)
+    if not lines:
+        return
+    
+    for text in split_notifications(lines):
+        _enqueue("send", chat_id, text)
+
+
+def queue_notification(chat_id: int, text: str) -> None:
+    """
+    Queue notification for chat, scheduling it immediately if batching is disabled.
+    
+    Args:
+        chat_id: Chat ID
+        text: Notification text
+    """
+    if not config.BATCH_ENABLED:
+        _enqueue("send", chat_id, text)
+        return
+    
+    buffer = _notify_buffers.setdefault(chat_id, [])
+    buffer.append(text)
+    
+    # Don't let a single chat accumulate notifications indefinitely
+    if len(buffer) >= config.MAX_BUFFER_SIZE:
+        _flush_chat(chat_id)
+
+
+async def flush_notifications(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Periodic job scheduling all pending notifications."""
+    try:
+        for chat_id in list(_notify_buffers):
+            _flush_chat(chat_id)
+    except Exception as e:
+        logger.exception(f"Error flushing notifications: {e}")
+
+
+async def _outbound_worker(bot: Bot) -> None:
+    """
+    Perform queued outbound actions until cancelled.
+    
+    Args:
+        bot: Bot instance
+    """
+    while True:
+        action, chat_id, payload = await _outbound_queue.get()
+        try:
+            if action == "delete":
+                await bot.delete_message(chat_id=chat_id, message_id=payload)
+            elif action == "unban":
+                await bot.unban_chat_member(chat_id=chat_id, user_id=payload, only_if_banned=True)
+            else:
+                await bot.send_message(chat_id=chat_id, text=payload, disable_notification=True)
+        except TelegramError as e:
+            logger.error(f"Failed to {action} message in chat {chat_id}: {e}")
+        except Exception as e:
+            logger.exception(f"Unexpected error during {action} in chat {chat_id}: {e}")
+        finally:
+            _outbound_queue.task_done()
+
+
+async def start_outbound_workers(bot: Bot) -> None:
+    """
+    Create outbound queue and start worker tasks.
+    
+    Args:
+        bot: Bot instance used by workers
+    """
+    global _outbound_queue
+    
+    _outbound_queue = asyncio.Queue(maxsize=OUTBOUND_QUEUE_SIZE)
+    for _ in range(OUTBOUND_WORKERS):
+        _outbound_tasks.append(asyncio.create_task(_outbound_worker(bot)))
+    logger.info(f"Started {OUTBOUND_WORKERS} outbound workers")
+
+
+async def stop_outbound_workers() -> None:
+    """Cancel worker tasks and drop the outbound queue."""
+    global _outbound_queue
+    
+    for task in _outbound_tasks:
+        task.cancel()
+    await asyncio.gather(*_outbound_tasks, return_exceptions=True)
+    _outbound_tasks.clear()
+    _outbound_queue = None
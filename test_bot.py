@@ -3,10 +3,13 @@ Simple tests for ModeratorBot functionality.
 Tests the key optimizations and utility functions.
 """
 
+import asyncio
 import os
 import tempfile
+import time
 import unittest
-from unittest.mock import Mock
+from collections import deque
+from unittest.mock import AsyncMock, Mock, patch
 
 # Set up test environment
 os.environ['BOT_TOKEN'] = 'test_token'
@@ -15,10 +18,15 @@ os.environ['RULES'] = 'Test rules'
 os.environ['ALLOWED_DOMAINS'] = 'example.com,github.com'
 os.environ['BANNED_WORDS'] = 'badword1,badword2'
 
+import utils
 from config import Config, get_config
+from database import Database
+from notifier import split_notifications
 from utils import (
     is_command_message, contains_banned_words, contains_links,
-    has_disallowed_links, is_allowed_domain
+    has_disallowed_links, is_allowed_domain, format_duration,
+    cleanup_flood_tracking, user_message_times, require_reply, classify_message,
+    is_admin, invalidate_admin_cache, NonAdminFilter, check_flood
 )
 
 
@@ -45,6 +53,13 @@ class TestConfig(unittest.TestCase):
         # This test ensures the validation logic works
         config = get_config()
         self.assertIsInstance(config.ADMIN_IDS, list)
+    
+    def test_admin_id_set(self):
+        """Test that admin IDs and allowed domains are also available as sets for lookups."""
+        config = get_config()
+        self.assertEqual(config.ADMIN_ID_SET, frozenset(config.ADMIN_IDS))
+        self.assertIn(123456789, config.ADMIN_ID_SET)
+        self.assertEqual(config.ALLOWED_DOMAIN_SET, frozenset(['example.com', 'github.com']))
 
 
 class TestUtilityFunctions(unittest.TestCase):
@@ -90,6 +105,187 @@ class TestUtilityFunctions(unittest.TestCase):
         self.assertTrue(has_disallowed_links('Visit https://badsite.com'))
         self.assertFalse(has_disallowed_links('Visit https://example.com'))
         self.assertFalse(has_disallowed_links('No links here'))
+    
+    def test_classify_message(self):
+        """Test that all content filters are applied in one call."""
+        self.assertEqual(classify_message('Say BADWORD1 https://badsite.com'), (True, False))
+        self.assertEqual(classify_message('Visit https://badsite.com'), (False, True))
+        self.assertEqual(classify_message('Visit https://example.com'), (False, False))
+        self.assertEqual(classify_message('https://badsite.com then badword2'), (True, False))
+        self.assertEqual(classify_message('https://example.com/badword1'), (True, False))
+        self.assertEqual(classify_message(''), (False, False))
+        # Typographic punctuation around an allowed link is not part of its host
+        self.assertEqual(classify_message('Смотри «https://example.com» тут'), (False, False))
+        self.assertEqual(classify_message('https://example.com…'), (False, False))
+        self.assertEqual(classify_message('“https://github.com/repo”'), (False, False))
+    
+    def test_format_duration(self):
+        """Test Russian plural forms of mute duration."""
+        self.assertEqual(format_duration(1), '1 час')
+        self.assertEqual(format_duration(3), '3 часа')
+        self.assertEqual(format_duration(5), '5 часов')
+        self.assertEqual(format_duration(12), '12 часов')
+        self.assertEqual(format_duration(21), '21 час')
+        self.assertEqual(format_duration(24), '24 часа')
+    
+    def test_cleanup_flood_tracking(self):
+        """Test that idle users are removed from flood tracking."""
+        user_message_times.clear()
+        user_message_times[1] = deque([time.monotonic() - 3600])
+        user_message_times[2] = deque([time.monotonic()])
+        
+        self.assertEqual(asyncio.run(cleanup_flood_tracking(chunk_size=1)), 1)
+        self.assertNotIn(1, user_message_times)
+        self.assertIn(2, user_message_times)
+        user_message_times.clear()
+    
+    def test_check_flood_window(self):
+        """Test that only messages inside the anti-flood window count towards the limit."""
+        user_message_times.clear()
+        limit = get_config().ANTIFLOOD_MAX_MESSAGES
+        window = get_config().ANTIFLOOD_WINDOW_SECONDS
+        
+        for i in range(limit):
+            self.assertFalse(check_flood(1, now=float(i)))
+        self.assertTrue(check_flood(1, now=float(limit)))
+        # Oldest messages have left the window by now
+        self.assertFalse(check_flood(1, now=float(limit + window)))
+        user_message_times.clear()
+    
+    def test_flood_tracking_limit(self):
+        """Test that the least recently active user is evicted once the tracking table is full."""
+        user_message_times.clear()
+        with patch.object(utils, 'FLOOD_MAX_TRACKED_USERS', 2):
+            for user_id in (1, 2, 1, 3):
+                check_flood(user_id)
+        self.assertEqual(list(user_message_times), [1, 3])
+        user_message_times.clear()
+    
+    def test_require_reply(self):
+        """Test that reply-only handlers answer with prompt when not a reply."""
+        handler = AsyncMock()
+        wrapped = require_reply('Reply please')(handler)
+        
+        update = Mock()
+        update.effective_message.reply_to_message = None
+        update.effective_message.reply_text = AsyncMock()
+        asyncio.run(wrapped(update, Mock()))
+        handler.assert_not_called()
+        update.effective_message.reply_text.assert_called_once_with(
+            'Reply please', disable_notification=True
+        )
+        
+        update.effective_message.reply_to_message = Mock()
+        asyncio.run(wrapped(update, Mock()))
+        handler.assert_called_once()
+    
+    def test_is_admin_uses_cache(self):
+        """Test that chat administrators are fetched once and refetched after invalidation."""
+        context = Mock()
+        context.bot.get_chat_administrators = AsyncMock(return_value=[Mock(user=Mock(id=5))])
+        chat = Mock(id=-100, type='supergroup')
+        
+        self.assertTrue(asyncio.run(is_admin(Mock(id=5), chat, context)))
+        self.assertFalse(asyncio.run(is_admin(Mock(id=6), chat, context)))
+        self.assertEqual(context.bot.get_chat_administrators.await_count, 1)
+        
+        invalidate_admin_cache(-100)
+        asyncio.run(is_admin(Mock(id=6), chat, context))
+        self.assertEqual(context.bot.get_chat_administrators.await_count, 2)
+        
+        # Cached administrators are filtered out without another API call
+        admin_filter = NonAdminFilter()
+        self.assertFalse(admin_filter.filter(Mock(chat_id=-100, from_user=Mock(id=5))))
+        self.assertFalse(admin_filter.filter(Mock(chat_id=-200, from_user=Mock(id=123456789))))
+        self.assertTrue(admin_filter.filter(Mock(chat_id=-100, from_user=Mock(id=6))))
+        self.assertTrue(admin_filter.filter(Mock(chat_id=-200, from_user=Mock(id=5))))
+        invalidate_admin_cache(-100)
+    
+    def test_is_admin_concurrent_misses(self):
+        """Test that concurrent checks in one chat share a single administrators request."""
+        async def fetch_admins(chat_id):
+            await asyncio.sleep(0)
+            return [Mock(user=Mock(id=5))]
+        
+        async def scenario():
+            return await asyncio.gather(*(is_admin(Mock(id=5), chat, context) for _ in range(5)))
+        
+        context = Mock()
+        context.bot.get_chat_administrators = AsyncMock(side_effect=fetch_admins)
+        chat = Mock(id=-300, type='supergroup')
+        
+        self.assertEqual(asyncio.run(scenario()), [True] * 5)
+        self.assertEqual(context.bot.get_chat_administrators.await_count, 1)
+        invalidate_admin_cache(-300)
+
+
+class TestNotifier(unittest.TestCase):
+    """Test notification batching."""
+    
+    def test_split_notifications(self):
+        """Test that notifications are joined and split at the message limit."""
+        self.assertEqual(split_notifications(['a', 'b']), ['a\nb'])
+        self.assertEqual(split_notifications(['aaa', 'bbb'], limit=5), ['aaa', 'bbb'])
+        self.assertEqual(split_notifications(['aa', 'bb', 'cc'], limit=5), ['aa\nbb', 'cc'])
+        self.assertEqual(split_notifications(['abcdef'], limit=5), ['abcde'])
+        self.assertEqual(split_notifications([]), [])
+
+
+
+class TestDatabase(unittest.TestCase):
+    """Test database caching."""
+    
+    def test_captcha_pending_and_warning_counts(self):
+        """Test that in-memory state follows database writes and survives reopening."""
+        async def scenario(path):
+            database = Database()
+            database.db_path = path
+            await database.init_db()
+            await database.add_captcha_pending(1, 100)
+            self.assertTrue(await database.is_captcha_pending(1))
+            self.assertFalse(await database.is_captcha_pending(2))
+            
+            self.assertEqual(await database.add_warning(1, 100), 1)
+            self.assertEqual(await database.add_warning(1, 100), 2)
+            self.assertEqual(await database.get_warning_count(1, 100), 2)
+            await database.clear_warnings(1, 100)
+            self.assertEqual(await database.get_warning_count(1, 100), 0)
+            self.assertEqual(await database.add_warning(1, 100), 1)
+            await database.close()
+            
+            reopened = Database()
+            reopened.db_path = path
+            await reopened.init_db()
+            self.assertTrue(await reopened.is_captcha_pending(1))
+            self.assertEqual(await reopened.get_warning_count(1, 100), 1)
+            await reopened.remove_captcha_pending(1)
+            self.assertFalse(await reopened.is_captcha_pending(1))
+            await reopened.close()
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            asyncio.run(scenario(os.path.join(tmpdir, 'bot.db')))
+    
+    def test_close_keeps_warnings_being_written(self):
+        """Test that closing while the background flush is writing still saves every warning."""
+        async def scenario(path):
+            database = Database()
+            database.db_path = path
+            await database.init_db()
+            for _ in range(41):
+                await database.add_warning(1, 100)
+            # Let the flush loop pick up the full buffer and open its transaction
+            for _ in range(3):
+                await asyncio.sleep(0)
+            await database.close()
+            
+            reopened = Database()
+            reopened.db_path = path
+            await reopened.init_db()
+            self.assertEqual(await reopened.get_warning_count(1, 100), 41)
+            await reopened.close()
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            asyncio.run(scenario(os.path.join(tmpdir, 'bot.db')))
 
 
 if __name__ == '__main__':
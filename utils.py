@@ -3,23 +3,102 @@ Utility functions for ModeratorBot.
 Contains common functions for command detection, user management, and filtering.
 """
 
+import asyncio
 import logging
 import re
-from datetime import datetime, timedelta
-from typing import List, Optional, Set
-from urllib.parse import urlparse
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache, wraps
+from typing import (
+    Awaitable, Callable, Deque, Dict, FrozenSet, Iterator, List, NamedTuple, Optional, Pattern, Set, Tuple
+)
+from urllib.parse import urlsplit
 
-from telegram import Chat, ChatMember, Message, Update, User
-from telegram.constants import ChatMemberStatus
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick is optional, banned words are matched with a regex without it
+    ahocorasick = None
+
+from telegram import Chat, ChatMember, ChatPermissions, Message, Update, User
+from telegram.constants import ChatMemberStatus, ChatType
 from telegram.error import BadRequest, Forbidden, TelegramError
-from telegram.ext import ContextTypes
+from telegram.ext import ContextTypes, filters
 
 from config import get_config
+from notifier import enqueue_unban
 
 # Set up logging
 logger = logging.getLogger(__name__)
 config = get_config()
 
+HandlerCallback = Callable[[Update, ContextTypes.DEFAULT_TYPE], Awaitable[None]]
+
+# Patterns compiled once at import instead of on every message
+# A URL runs until whitespace, a quote, a closing bracket or angle bracket, or typographic
+# quotes and ellipsis, so links written as «https://example.com» keep a clean host
+_URL_PATTERN = r'https?://[^\s<>"\'\])«»‹›“”„‘’‚…]+'
+_BANNED_PATTERN = '|'.join(map(re.escape, config.BANNED_WORDS))
+_URL_RE = re.compile(_URL_PATTERN)
+_BANNED_RE: Optional[Pattern[str]] = re.compile(_BANNED_PATTERN, re.IGNORECASE) if _BANNED_PATTERN else None
+
+
+def _build_banned_automaton(words: List[str]) -> 'ahocorasick.Automaton':
+    """
+    Build Aho-Corasick automaton matching any of the banned words.
+    
+    Args:
+        words: Banned words in lower case
+        
+    Returns:
+        ahocorasick.Automaton: Automaton ready for searching
+    """
+    automaton = ahocorasick.Automaton()
+    for word in words:
+        automaton.add_word(word, word)
+    automaton.make_automaton()
+    return automaton
+
+
+# With pyahocorasick, banned words are found in one pass regardless of how many there are
+_BANNED_AUTOMATON = (
+    _build_banned_automaton(config.BANNED_WORDS) if ahocorasick is not None and config.BANNED_WORDS else None
+)
+# URLs and banned words in one alternation, so classify_message() walks the text once
+_CONTENT_RE = re.compile(
+    f'(?P<url>{_URL_PATTERN})|(?P<banned>(?i:{_BANNED_PATTERN}))' if _BANNED_PATTERN and _BANNED_AUTOMATON is None
+    else f'(?P<url>{_URL_PATTERN})'
+)
+
+
+# Permissions for muted users and for users released after captcha, built once
+MUTED_PERMISSIONS = ChatPermissions.no_permissions()
+UNMUTED_PERMISSIONS = ChatPermissions(
+    can_send_messages=True,
+    can_send_audios=True,
+    can_send_documents=True,
+    can_send_photos=True,
+    can_send_videos=True,
+    can_send_video_notes=True,
+    can_send_voice_notes=True,
+    can_send_polls=True,
+    can_send_other_messages=True,
+    can_add_web_page_previews=True,
+    can_change_info=False,
+    can_invite_users=False,
+    can_pin_messages=False
+)
+
+# Administrator IDs per chat with expiry time on the monotonic clock
+_admin_cache: Dict[int, Tuple[FrozenSet[int], float]] = {}
+# Per-chat locks so concurrent cache misses share one get_chat_administrators call
+_admin_locks: Dict[int, asyncio.Lock] = {}
+
+
+class MessageFlags(NamedTuple):
+    """Result of checking message text against content filters."""
+    banned_words: bool
+    disallowed_links: bool
+
 
 def is_command_message(message: Message) -> bool:
     """
@@ -35,9 +114,9 @@ def is_command_message(message: Message) -> bool:
     if not message or not message.text:
         return False
     
-    text = message.text.strip()
-    # Check if message starts with / (command prefix)
-    if text.startswith('/'):
+    text = message.text
+    # Check if message starts with / (command prefix), stripping only when it starts with whitespace
+    if text[0] == '/' or (text[0].isspace() and text.lstrip().startswith('/')):
         return True
     
     # Check for bot mentions with commands
@@ -62,18 +141,166 @@ async def is_admin(user: User, chat: Chat, context: ContextTypes.DEFAULT_TYPE) -
         bool: True if user is admin, False otherwise
     """
     # Check if user is in configured admin list
-    if user.id in config.ADMIN_IDS:
+    if user.id in config.ADMIN_ID_SET:
         return True
     
+    # Private chats have no administrators
+    if chat.type == ChatType.PRIVATE:
+        return False
+    
     # Check if user is chat administrator
     try:
-        chat_member = await context.bot.get_chat_member(chat.id, user.id)
-        return chat_member.status in [ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER]
+        return user.id in await get_chat_admin_ids(chat.id, context)
     except (BadRequest, Forbidden, TelegramError) as e:
         logger.error(f"Error checking admin status for user {user.id} in chat {chat.id}: {e}")
         return False
 
 
+async def get_chat_admin_ids(chat_id: int, context: ContextTypes.DEFAULT_TYPE) -> FrozenSet[int]:
+    """
+    Get IDs of chat administrators, cached for ADMIN_CACHE_TTL seconds.
+    
+    Args:
+        chat_id: Chat ID
+        context: Bot context
+        
+    Returns:
+        FrozenSet[int]: IDs of chat administrators and owner
+    """
+    admin_ids = get_cached_admin_ids(chat_id)
+    if admin_ids is not None:
+        return admin_ids
+    
+    lock = _admin_locks.get(chat_id)
+    if lock is None:
+        lock = _admin_locks[chat_id] = asyncio.Lock()
+    
+    async with lock:
+        # Another handler may have fetched the list while we were waiting
+        admin_ids = get_cached_admin_ids(chat_id)
+        if admin_ids is not None:
+            return admin_ids
+        
+        administrators = await context.bot.get_chat_administrators(chat_id)
+        admin_ids = frozenset(member.user.id for member in administrators)
+        _admin_cache[chat_id] = (admin_ids, time.monotonic() + config.ADMIN_CACHE_TTL)
+        return admin_ids
+
+
+def get_cached_admin_ids(chat_id: int) -> Optional[FrozenSet[int]]:
+    """
+    Get IDs of chat administrators from cache without calling the API.
+    
+    Args:
+        chat_id: Chat ID
+        
+    Returns:
+        Optional[FrozenSet[int]]: Cached administrator IDs, None if missing or expired
+    """
+    cached = _admin_cache.get(chat_id)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+    return None
+
+
+class NonAdminFilter(filters.MessageFilter):
+    """
+    Filter rejecting messages from configured admins and cached chat administrators.
+    Filters can't await, so on a cache miss the message passes and the handler checks is_admin().
+    """
+    
+    def filter(self, message: Message) -> bool:
+        """
+        Check that sender is not known to be an administrator.
+        
+        Args:
+            message: Telegram message object
+            
+        Returns:
+            bool: False if sender is a known administrator, True otherwise
+        """
+        user = message.from_user
+        if user is None:
+            return True
+        if user.id in config.ADMIN_ID_SET:
+            return False
+        
+        admin_ids = get_cached_admin_ids(message.chat_id)
+        return admin_ids is None or user.id not in admin_ids
+
+
+def invalidate_admin_cache(chat_id: int) -> None:
+    """
+    Drop cached administrators of chat so the next check refetches them.
+    
+    Args:
+        chat_id: Chat ID
+    """
+    _admin_cache.pop(chat_id, None)
+
+
+def is_admin_status_change(old_status: str, new_status: str) -> bool:
+    """
+    Check if chat member update grants or revokes administrator rights.
+    
+    Args:
+        old_status: Member status before the update
+        new_status: Member status after the update
+        
+    Returns:
+        bool: True if the member became or stopped being an administrator
+    """
+    admin_statuses = (ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER)
+    return (old_status in admin_statuses) != (new_status in admin_statuses)
+
+
+def require_admin(handler: HandlerCallback) -> HandlerCallback:
+    """
+    Decorator running command handler only for administrators.
+    Commands from other users are silently ignored.
+    
+    Args:
+        handler: Command handler to wrap
+        
+    Returns:
+        HandlerCallback: Wrapped handler
+    """
+    @wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        if not await is_admin(update.effective_user, update.effective_chat, context):
+            return
+        await handler(update, context)
+    
+    return wrapper
+
+
+def require_reply(prompt: str) -> Callable[[HandlerCallback], HandlerCallback]:
+    """
+    Decorator running command handler only if the command replies to a message.
+    
+    Args:
+        prompt: Text sent back when the command is not a reply
+        
+    Returns:
+        Callable: Decorator for command handler
+    """
+    def decorator(handler: HandlerCallback) -> HandlerCallback:
+        @wraps(handler)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+            message = update.effective_message
+            if not message.reply_to_message:
+                try:
+                    await message.reply_text(prompt, disable_notification=True)
+                except TelegramError as e:
+                    logger.error(f"Failed to send reply prompt in chat {message.chat_id}: {e}")
+                return
+            await handler(update, context)
+        
+        return wrapper
+    
+    return decorator
+
+
 async def mute_user(
     user_id: int, 
     chat_id: int, 
@@ -95,21 +322,13 @@ async def mute_user(
         bool: True if mute was successful, False otherwise
     """
     try:
-        until_date = datetime.now() + timedelta(hours=duration_hours)
+        # Bot API takes a Unix timestamp, no datetime arithmetic needed
+        until_date = int(time.time()) + duration_hours * 3600
         
         await context.bot.restrict_chat_member(
             chat_id=chat_id,
             user_id=user_id,
-            permissions={
-                'can_send_messages': False,
-                'can_send_media_messages': False,
-                'can_send_polls': False,
-                'can_send_other_messages': False,
-                'can_add_web_page_previews': False,
-                'can_change_info': False,
-                'can_invite_users': False,
-                'can_pin_messages': False
-            },
+            permissions=MUTED_PERMISSIONS,
             until_date=until_date
         )
         
@@ -150,8 +369,9 @@ async def kick_user(
     """
     try:
         await context.bot.ban_chat_member(chat_id=chat_id, user_id=user_id)
-        # Unban immediately to allow rejoin
-        await context.bot.unban_chat_member(chat_id=chat_id, user_id=user_id)
+        # Unban to allow rejoin, in the background unless the outbound queue can't take it
+        if not enqueue_unban(chat_id, user_id):
+            await context.bot.unban_chat_member(chat_id=chat_id, user_id=user_id)
         
         logger.info(f"Successfully kicked user {user_id} from chat {chat_id}. Reason: {reason}")
         return True
@@ -180,14 +400,13 @@ def contains_banned_words(text: str) -> bool:
     Returns:
         bool: True if text contains banned words, False otherwise
     """
-    if not text or not config.BANNED_WORDS:
+    if not text or _BANNED_RE is None:
         return False
     
-    text_lower = text.lower()
-    for banned_word in config.BANNED_WORDS:
-        if banned_word in text_lower:
-            return True
-    return False
+    if _BANNED_AUTOMATON is not None:
+        return next(_BANNED_AUTOMATON.iter(text.lower()), None) is not None
+    
+    return _BANNED_RE.search(text) is not None
 
 
 def contains_links(text: str) -> bool:
@@ -203,9 +422,7 @@ def contains_links(text: str) -> bool:
     if not text:
         return False
     
-    # Simple URL pattern matching
-    url_pattern = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-    return bool(re.search(url_pattern, text))
+    return _URL_RE.search(text) is not None
 
 
 def is_allowed_domain(url: str) -> bool:
@@ -218,22 +435,39 @@ def is_allowed_domain(url: str) -> bool:
     Returns:
         bool: True if domain is allowed, False otherwise
     """
-    if not config.ALLOWED_DOMAINS:
+    if not config.ALLOWED_DOMAIN_SET:
         return False
     
     try:
-        parsed_url = urlparse(url)
-        domain = parsed_url.netloc.lower()
+        # hostname is already lowercased and has no port or credentials
+        domain = urlsplit(url).hostname or ''
         
         # Remove www. prefix if present
         if domain.startswith('www.'):
             domain = domain[4:]
         
-        return domain in [allowed_domain.lower() for allowed_domain in config.ALLOWED_DOMAINS]
+        return domain in config.ALLOWED_DOMAIN_SET
     except Exception:
         return False
 
 
+def iter_urls(text: str) -> Iterator[str]:
+    """
+    Yield URLs found in text one at a time, so callers can stop early.
+    
+    Args:
+        text: Text to scan
+        
+    Returns:
+        Iterator[str]: URLs in order of appearance
+    """
+    if not text:
+        return
+    
+    for match in _URL_RE.finditer(text):
+        yield match.group()
+
+
 def extract_urls_from_text(text: str) -> List[str]:
     """
     Extract URLs from text.
@@ -244,11 +478,7 @@ def extract_urls_from_text(text: str) -> List[str]:
     Returns:
         List[str]: List of URLs found in text
     """
-    if not text:
-        return []
-    
-    url_pattern = r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-    return re.findall(url_pattern, text)
+    return list(iter_urls(text))
 
 
 def has_disallowed_links(text: str) -> bool:
@@ -261,44 +491,142 @@ def has_disallowed_links(text: str) -> bool:
     Returns:
         bool: True if text contains disallowed links, False otherwise
     """
-    urls = extract_urls_from_text(text)
-    for url in urls:
-        if not is_allowed_domain(url):
-            return True
-    return False
+    # Stop at the first disallowed URL without collecting the rest
+    return any(not is_allowed_domain(url) for url in iter_urls(text))
 
 
-# Anti-flood tracking
-user_message_times: dict = {}
+def classify_message(text: str) -> MessageFlags:
+    """
+    Run all content filters over message text in a single pass.
+    Banned words take priority: once one is found, links no longer matter.
+    
+    Args:
+        text: Text to check
+        
+    Returns:
+        MessageFlags: Which filters the text violates
+    """
+    if not text:
+        return MessageFlags(False, False)
+    
+    # The automaton scans the whole text, URLs included, before links are looked at
+    if _BANNED_AUTOMATON is not None and contains_banned_words(text):
+        return MessageFlags(True, False)
+    
+    disallowed_links = False
+    for match in _CONTENT_RE.finditer(text):
+        url = match.group('url')
+        if url is None:
+            return MessageFlags(True, False)
+        # A URL match consumes its text, so look for banned words inside it separately
+        if _BANNED_AUTOMATON is None and contains_banned_words(url):
+            return MessageFlags(True, False)
+        if not disallowed_links and not is_allowed_domain(url):
+            disallowed_links = True
+    return MessageFlags(False, disallowed_links)
+
+
+# Anti-flood settings bound once, check_flood() runs for every message
+FLOOD_HISTORY_LENGTH = config.ANTIFLOOD_MAX_MESSAGES + 1
+FLOOD_WINDOW_SECONDS = config.ANTIFLOOD_WINDOW_SECONDS
+
+# Most users tracked at once, the least recently active user is forgotten first
+FLOOD_MAX_TRACKED_USERS = 100000
 
+# Anti-flood tracking: monotonic times of each user's latest messages, least recently active first
+user_message_times: 'OrderedDict[int, Deque[float]]' = OrderedDict()
 
-def check_flood(user_id: int) -> bool:
+
+def check_flood(user_id: int, now: Optional[float] = None) -> bool:
     """
     Check if user is flooding messages.
     
     Args:
         user_id: ID of user to check
+        now: Message time on the monotonic clock, current time if not given
         
     Returns:
         bool: True if user is flooding, False otherwise
     """
-    current_time = datetime.now()
+    current_time = time.monotonic() if now is None else now
     
-    if user_id not in user_message_times:
-        user_message_times[user_id] = []
+    # Only the last MAX + 1 messages matter, older ones fall off the deque
+    times = user_message_times.get(user_id)
+    if times is None:
+        times = user_message_times[user_id] = deque(maxlen=FLOOD_HISTORY_LENGTH)
+        if len(user_message_times) > FLOOD_MAX_TRACKED_USERS:
+            user_message_times.popitem(last=False)
+    else:
+        user_message_times.move_to_end(user_id)
+    times.append(current_time)
     
-    # Add current message time
-    user_message_times[user_id].append(current_time)
+    # User exceeded the limit if the oldest of those messages is still inside the window
+    return len(times) == FLOOD_HISTORY_LENGTH and current_time - times[0] <= FLOOD_WINDOW_SECONDS
+
+
+# Users checked by cleanup_flood_tracking() before yielding to the event loop
+FLOOD_CLEANUP_CHUNK_SIZE = 1024
+
+
+async def cleanup_flood_tracking(chunk_size: int = FLOOD_CLEANUP_CHUNK_SIZE) -> int:
+    """
+    Forget users who sent nothing within the anti-flood window.
+    Users are ordered by last activity, so only the idle ones at the front are visited.
+    Works in chunks so a large table doesn't stall message handling.
     
-    # Remove old messages outside the window
-    window_start = current_time - timedelta(seconds=config.ANTIFLOOD_WINDOW_SECONDS)
-    user_message_times[user_id] = [
-        msg_time for msg_time in user_message_times[user_id] 
-        if msg_time >= window_start
-    ]
+    Args:
+        chunk_size: Number of users removed between yields to the event loop
+        
+    Returns:
+        int: Number of users removed from tracking
+    """
+    window_start = time.monotonic() - FLOOD_WINDOW_SECONDS
+    removed = 0
+    
+    while user_message_times:
+        # Users may have sent messages while we were yielding, which moves them to the end
+        user_id, times = next(iter(user_message_times.items()))
+        if times and times[-1] >= window_start:
+            break
+        del user_message_times[user_id]
+        removed += 1
+        if removed % chunk_size == 0:
+            await asyncio.sleep(0)
+    return removed
+
+
+@lru_cache(maxsize=64)
+def format_duration(hours: int) -> str:
+    """
+    Format mute duration in hours with correct Russian plural form.
+    Cached because only a handful of distinct durations are used.
     
-    # Check if user exceeded message limit
-    return len(user_message_times[user_id]) > config.ANTIFLOOD_MAX_MESSAGES
+    Args:
+        hours: Duration in hours
+        
+    Returns:
+        str: Formatted duration, e.g. "1 час", "3 часа", "24 часа"
+    """
+    last_two = hours % 100
+    last = hours % 10
+    if 11 <= last_two <= 14:
+        unit = "часов"
+    elif last == 1:
+        unit = "час"
+    elif 2 <= last <= 4:
+        unit = "часа"
+    else:
+        unit = "часов"
+    return f"{hours} {unit}"
+
+
+@lru_cache(maxsize=4096)
+def _format_mention(user_id: int, username: Optional[str], first_name: str) -> str:
+    """Build mention text, cached per distinct user identity."""
+    if username:
+        return f"@{username}"
+    else:
+        return f"{first_name} (ID: {user_id})"
 
 
 def format_user_mention(user: User) -> str:
@@ -311,7 +639,4 @@ def format_user_mention(user: User) -> str:
     Returns:
         str: Formatted user mention
     """
-    if user.username:
-        return f"@{user.username}"
-    else:
-        return f"{user.first_name} (ID: {user.id})"
\ No newline at end of file
+    return _format_mention(user.id, user.username, user.first_name)
\ No newline at end of file